@@ -1,17 +1,199 @@
 #!/usr/bin/env python3
 
+import bisect
 import itertools
+import random
+import sys
+import timeit
 import unittest
+from collections import Counter, defaultdict
 
 def read_input(f):
     return list(map(int, f))
 
-def get_matching_sum(nums, s, n):
+def get_matching_sum_brute_force(nums, s, n):
     for i in itertools.combinations(nums, n):
         if sum(i) == s:
             return i
     return None
 
+# Every search below returns the same tuple as get_matching_sum_brute_force: the match whose indices come first in
+# itertools.combinations order, with its numbers in input order.
+
+def get_matching_sum_2(nums, s):
+    last = {num: i for i, num in enumerate(nums)}
+    for i, num in enumerate(nums):
+        if last.get(s - num, -1) > i: # The lowest i with a partner after it starts the first pair.
+            return num, s - num
+    return None
+
+def get_matching_sum_3(nums, s):
+    return SumIndex(nums).find_sum_3(s)
+
+def get_matching_sum_meet_in_the_middle(nums, s, n):
+    # Every n-combination (by index) splits into a lower half whose last index is below the upper half's first index.
+    # Lower halves are generated in combinations order, so for each upper half the first compatible lower half with
+    # the right sum gives its earliest combination; the earliest of those overall is the answer.
+    lower_n = n // 2
+    lower = defaultdict(list)
+    for combo in itertools.combinations(range(len(nums)), lower_n):
+        lower[sum(nums[i] for i in combo)].append(combo)
+    best = None
+    for combo in itertools.combinations(range(len(nums)), n - lower_n):
+        for match in lower.get(s - sum(nums[i] for i in combo), ()):
+            if match[-1] < combo[0]:
+                if best is None or match + combo < best:
+                    best = match + combo
+                break
+    return tuple(nums[i] for i in best) if best is not None else None
+
+def get_matching_sum(nums, s, n):
+    if n == 2:
+        return get_matching_sum_2(nums, s)
+    elif n == 3:
+        return get_matching_sum_3(nums, s)
+    elif n > 3:
+        return get_matching_sum_meet_in_the_middle(nums, s, n)
+    else:
+        return get_matching_sum_brute_force(nums, s, n)
+
+class SumIndex:
+    """Answers many target-sum queries against the same numbers without re-scanning them from scratch."""
+
+    def __init__(self, nums):
+        self.nums = nums
+        self.positions = defaultdict(list)
+        for i, num in enumerate(nums):
+            self.positions[num].append(i)
+        self.values = sorted(self.positions)
+        self.last = {num: positions[-1] for num, positions in self.positions.items()}
+
+        # Smallest and largest sum of two numbers at or after each index, to skip first numbers that can't match.
+        inf = float('inf')
+        self.pair_min = [inf] * (len(nums) + 1)
+        self.pair_max = [-inf] * (len(nums) + 1)
+        low = [inf, inf]
+        high = [-inf, -inf]
+        for i in reversed(range(len(nums))):
+            low = sorted(low + [nums[i]])[:2]
+            high = sorted(high + [nums[i]])[-2:]
+            self.pair_min[i] = sum(low)
+            self.pair_max[i] = sum(high)
+
+    def _is_available(self, *values):
+        return all(len(self.positions[value]) >= count for value, count in Counter(values).items())
+
+    def _has_sum_2(self, s):
+        values = self.values
+        if not values:
+            return False
+        # a must reach s with b at most the largest value.
+        for k in range(bisect.bisect_left(values, s - values[-1]), len(values)):
+            a = values[k]
+            b = s - a
+            if b < a:
+                break
+            if b in self.positions and self._is_available(a, b):
+                return True
+        return False
+
+    def _has_sum_3(self, s):
+        values = self.values
+        for i, a in enumerate(values):
+            if 3 * a > s:
+                break # a is the smallest of the three, so every remaining sum is too large.
+            if a + 2 * values[-1] < s:
+                continue # Even the two largest values can't make up the rest.
+            # Skip values too large to pair with a and a value at least as large as a, then values too small to pair
+            # with the largest remaining one.
+            hi = bisect.bisect_right(values, s - 2 * a) - 1
+            if hi < i:
+                continue
+            lo = bisect.bisect_left(values, s - a - values[hi], i)
+            while lo <= hi:
+                sum_ = a + values[lo] + values[hi]
+                if sum_ == s and self._is_available(a, values[lo], values[hi]):
+                    return True
+                elif sum_ <= s:
+                    lo += 1
+                else:
+                    hi -= 1
+        return False
+
+    # The value-ordered checks above quickly rule out targets with no match. When there is one, a scan in index order
+    # finds the match get_matching_sum_brute_force would: the lowest first index with a partner after it, and so on.
+
+    def find_sum_2(self, s):
+        if not self._has_sum_2(s):
+            return None
+        nums, last = self.nums, self.last
+        for i in range(len(nums)):
+            if last.get(s - nums[i], -1) > i:
+                return nums[i], s - nums[i]
+
+    def _has_pair_after(self, t, i):
+        values, positions, last = self.values, self.positions, self.last
+        # a <= b, so a <= t / 2, and b is at most the largest value.
+        for k in range(bisect.bisect_left(values, t - values[-1]), bisect.bisect_right(values, t // 2)):
+            a = values[k]
+            b = t - a
+            if last[a] > i and last.get(b, -1) > i and (a != b or len(positions[a]) > 1 and positions[a][-2] > i):
+                return True
+        return False
+
+    def find_sum_3(self, s):
+        if not self._has_sum_3(s):
+            return None
+        nums, last = self.nums, self.last
+        for i in range(len(nums) - 2):
+            t = s - nums[i]
+            if not self.pair_min[i+1] <= t <= self.pair_max[i+1] or not self._has_pair_after(t, i):
+                continue
+            for j in range(i + 1, len(nums) - 1):
+                if last.get(t - nums[j], -1) > j:
+                    return nums[i], nums[j], t - nums[j]
+        return None
+
+    def query(self, targets, n):
+        if n == 2:
+            return [self.find_sum_2(s) for s in targets]
+        elif n == 3:
+            return [self.find_sum_3(s) for s in targets]
+        else:
+            return [get_matching_sum(self.nums, s, n) for s in targets]
+
+def benchmark():
+    rng = random.Random(2020)
+    for size in (100, 200, 400, 1000, 10000, 100000):
+        # Half the numbers are small enough to take part in a sum, so neither search can stop early.
+        nums = [rng.randrange(1, 10**6) if i % 2 else rng.randrange(1, 2020) * 7 for i in range(size)]
+        for n in (2, 3):
+            s = 2020
+            engine = min(timeit.repeat(lambda: get_matching_sum(nums, s, n), number=1, repeat=3))
+            if size ** n <= 10**6:
+                brute = f'{min(timeit.repeat(lambda: get_matching_sum_brute_force(nums, s, n), number=1, repeat=3)):.6f}s'
+            else:
+                brute = 'skipped'
+            print(f'size={size} n={n}: engine {engine:.6f}s, combinations {brute}')
+
+    # Large targets against large numbers, where nearly every target has a match.
+    for size in (1000, 10000, 100000):
+        nums = [rng.randrange(1, 10**6) for _ in range(size)]
+        for n, s in ((2, 1_500_000), (3, 2_500_000)):
+            engine = min(timeit.repeat(lambda: get_matching_sum(nums, s, n), number=1, repeat=3))
+            print(f'size={size} n={n} s={s}: engine {engine:.6f}s')
+
+    for size in (1000, 10000, 100000):
+        nums = [rng.randrange(1, 10**6) for _ in range(size)]
+        build = min(timeit.repeat(lambda: SumIndex(nums), number=1, repeat=3))
+        index = SumIndex(nums)
+        for n in (2, 3):
+            for label, targets in (('small', [rng.randrange(1, 3 * 10**4) for _ in range(1000)]),
+                                   ('matching', [rng.randrange(5 * 10**5, (n - 1) * 10**6) for _ in range(1000)])):
+                query = min(timeit.repeat(lambda: index.query(targets, n), number=1, repeat=3))
+                found = sum(result is not None for result in index.query(targets, n))
+                print(f'size={size} n={n}: index build {build:.6f}s, {len(targets)} {label} queries ({found} matched) {query:.6f}s')
+
 class Test(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -25,7 +207,58 @@ class Test(unittest.TestCase):
         a, b, c = get_matching_sum(self.nums, 2020, 3)
         self.assertEqual(a * b * c, 241861950)
 
+    def test_matches_brute_force(self):
+        self.assertEqual(get_matching_sum([0, 1, 2, 3], 3, 2), (0, 3))
+        self.assertEqual(get_matching_sum([3, 2, 1, 0, 0], 3, 3), (3, 0, 0))
+        self.assertEqual(get_matching_sum([1, 2, 3, 4, 0, 0], 6, 4), (1, 2, 3, 0))
+
+        rng = random.Random(0)
+        for _ in range(1000):
+            nums = [rng.randrange(-20, 50) for _ in range(rng.randrange(12))]
+            s = rng.randrange(-10, 100)
+            for n in range(1, 6):
+                self.assertEqual(get_matching_sum(nums, s, n), get_matching_sum_brute_force(nums, s, n), f'nums = {nums}, s = {s}, n = {n}')
+
+    def test_large_targets(self):
+        rng = random.Random(2)
+        nums = [rng.randrange(1, 10**6) for _ in range(120)]
+        for n in (2, 3):
+            s = sum(sorted(nums)[-n-3:-3]) # Large, and guaranteed to have a match.
+            exp = get_matching_sum_brute_force(nums, s, n)
+            self.assertIsNotNone(exp)
+            self.assertEqual(get_matching_sum(nums, s, n), exp)
+            self.assertEqual(SumIndex(nums).query([s], n), [exp])
+
+    def test_sum_index_matching_batch(self):
+        # Thousands of large targets that nearly all have matches, answered in one batch call.
+        rng = random.Random(3)
+        nums = [rng.randrange(1, 10**6) for _ in range(10**4)]
+        index = SumIndex(nums)
+        for n in (2, 3):
+            targets = [rng.randrange(5 * 10**5, (n - 1) * 10**6) for _ in range(2000)]
+            results = index.query(targets, n)
+            self.assertGreater(sum(result is not None for result in results), 1900)
+            for s, result in zip(targets[:50], results):
+                self.assertEqual(result, get_matching_sum(nums, s, n))
+
+    def test_sum_index(self):
+        index = SumIndex(self.nums)
+        self.assertEqual(index.query([2020], 2), [(1721, 299)])
+        self.assertEqual(index.query([2020], 3), [(979, 366, 675)])
+
+        rng = random.Random(1)
+        for _ in range(100):
+            nums = [rng.randrange(-20, 50) for _ in range(rng.randrange(12))]
+            index = SumIndex(nums)
+            targets = list(range(-20, 100))
+            for n in (2, 3, 4):
+                self.assertEqual(index.query(targets, n), [get_matching_sum_brute_force(nums, s, n) for s in targets], f'nums = {nums}, n = {n}')
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+        sys.exit()
+
     unittest.main(exit=False)
     with open('input.txt') as f:
         nums = read_input(f)
@@ -1,12 +1,21 @@
 #!/usr/bin/env python3
 
+import itertools
+import mmap
+import os
 import re
 import unittest
+from array import array
 from collections import namedtuple
 from io import StringIO
 
 Policy = namedtuple('Policy', ['first_pos', 'second_pos', 'letter'])
 
+# Column-per-field view of a whole input file. Passwords stay in the shared buffer and are referenced by offsets.
+PasswordColumns = namedtuple('PasswordColumns', ['first_pos', 'second_pos', 'letters', 'password_starts', 'password_ends', 'buffer'])
+
+column_line_pattern = re.compile(rb'([0-9]+)-([0-9]+) ([a-zA-Z]): ([^\n]+?)[ \t\r\f\v]*(?:\n|\Z)')
+
 def parse_line(line):
     line = line.rstrip()
     match = re.fullmatch(r'([0-9]+)-([0-9]+) ([a-zA-Z]): (.+)', line)
@@ -19,9 +28,72 @@ def parse_line(line):
 def read_input(f):
     return list(map(parse_line, f))
 
+def read_columns(f):
+    buffer = f.read()
+    if isinstance(buffer, str):
+        buffer = buffer.encode()
+
+    columns = PasswordColumns(array('l'), array('l'), bytearray(), array('l'), array('l'), buffer)
+    pos = 0
+    for match in column_line_pattern.finditer(buffer):
+        if match.start() != pos:
+            break
+        columns.first_pos.append(int(match.group(1)))
+        columns.second_pos.append(int(match.group(2)))
+        columns.letters.append(buffer[match.start(3)])
+        columns.password_starts.append(match.start(4))
+        columns.password_ends.append(match.end(4))
+        pos = match.end()
+    if pos != len(buffer):
+        line = buffer[pos:].split(b'\n', 1)[0].decode()
+        raise Exception(f'invalid input line: "{line}"')
+    return columns
+
+def iter_input(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        return # Empty files can't be mapped.
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        # readline returns copies, so no views into the map outlive it.
+        for line in iter(buffer.readline, b''):
+            match = column_line_pattern.match(line)
+            if not match or match.end() != len(line):
+                raise Exception(f'invalid input line: "{line.decode().rstrip()}"')
+            yield Policy(int(match.group(1)), int(match.group(2)), match.group(3).decode()), match.group(4).decode()
+
+def iter_input_chunks(f, chunk_size):
+    records = iter_input(f)
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def count_valid(records, is_valid):
+    count = 0
+    for policy, password in records:
+        count += is_valid(policy, password)
+    return count
+
 def password_is_valid(policy, password):
     return (password[policy.first_pos - 1] == policy.letter) ^ (password[policy.second_pos - 1] == policy.letter)
 
+def password_is_valid_count(policy, password):
+    return policy.first_pos <= password.count(policy.letter) <= policy.second_pos
+
+def passwords_are_valid(columns):
+    buffer = columns.buffer
+    def matches(start, end, pos, letter):
+        return start + pos <= end and buffer[start + pos - 1] == letter
+    return [matches(start, end, first, letter) ^ matches(start, end, second, letter)
+            for first, second, letter, start, end
+            in zip(columns.first_pos, columns.second_pos, columns.letters, columns.password_starts, columns.password_ends)]
+
+def passwords_are_valid_count(columns):
+    count = columns.buffer.count
+    return [first <= count(letter, start, end) <= second
+            for first, second, letter, start, end
+            in zip(columns.first_pos, columns.second_pos, columns.letters, columns.password_starts, columns.password_ends)]
+
 class Test(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -33,11 +105,43 @@ class Test(unittest.TestCase):
         valid = [password_is_valid(policy, password) for policy, password in input_]
         self.assertEqual(valid, [True, False, False])
 
+    def test_read_columns(self):
+        columns = read_columns(StringIO('1-3 a: abcde\n1-3 b: cdefg\n2-9 c: ccccccccc\n'))
+        self.assertEqual(list(columns.first_pos), [1, 1, 2])
+        self.assertEqual(list(columns.second_pos), [3, 3, 9])
+        self.assertEqual(bytes(columns.letters), b'abc')
+        passwords = [columns.buffer[start:end] for start, end in zip(columns.password_starts, columns.password_ends)]
+        self.assertEqual(passwords, [b'abcde', b'cdefg', b'ccccccccc'])
+        self.assertEqual(passwords_are_valid(columns), [True, False, False])
+        self.assertEqual(passwords_are_valid_count(columns), [True, False, True])
+
+        with self.assertRaises(Exception):
+            read_columns(StringIO('1-3 a: abcde\nbad line\n'))
+
+    def test_iter_input(self):
+        with open('input.txt') as f:
+            input_ = read_input(f)
+        with open('input.txt', 'rb') as f:
+            self.assertEqual(list(iter_input(f)), input_)
+        with open('input.txt', 'rb') as f:
+            chunks = list(iter_input_chunks(f, 64))
+        self.assertTrue(all(len(chunk) == 64 for chunk in chunks[:-1]))
+        self.assertEqual(sum(chunks, []), input_)
+        with open('input.txt', 'rb') as f:
+            self.assertEqual(count_valid(iter_input(f), password_is_valid), sum(password_is_valid(*record) for record in input_))
+
+    def test_columns_match_read_input(self):
+        with open('input.txt') as f:
+            input_ = read_input(f)
+        with open('input.txt', 'rb') as f:
+            columns = read_columns(f)
+        self.assertEqual(passwords_are_valid(columns), [password_is_valid(policy, password) for policy, password in input_])
+        self.assertEqual(passwords_are_valid_count(columns), [password_is_valid_count(policy, password) for policy, password in input_])
+
 if __name__ == '__main__':
     unittest.main(exit=False)
 
-    with open('input.txt') as f:
-        input_ = read_input(f)
+    with open('input.txt', 'rb') as f:
+        columns = read_columns(f)
 
-    valid = [password_is_valid(policy, password) for policy, password in input_]
-    print(sum(valid))
+    print(sum(passwords_are_valid(columns)))
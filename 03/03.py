@@ -1,6 +1,15 @@
 #!/usr/bin/env python3
 
+import random
+import sys
+import timeit
 import unittest
+from collections import namedtuple
+
+# Each row is an int whose bit i is set when column i holds a tree.
+PackedTrees = namedtuple('PackedTrees', ['rows', 'width'])
+
+tree_bits = str.maketrans('.#', '01')
 
 def parse_line(line):
     return list(map(lambda x: x == '#', line.rstrip()))
@@ -13,6 +22,57 @@ def count_trees(trees, right, down):
     assert(all(len(row) == width for row in trees))
     return sum(trees[row][right*(i+1) % width] for i, row in enumerate(range(down, len(trees), down)))
 
+def parse_line_packed(line):
+    return int(line.rstrip().translate(tree_bits)[::-1], 2)
+
+def read_input_packed(f):
+    rows = []
+    width = None
+    for line in f:
+        line = line.rstrip()
+        if width is None:
+            width = len(line)
+        assert(len(line) == width)
+        rows.append(parse_line_packed(line))
+    return PackedTrees(rows, width)
+
+def count_trees_packed(trees, right, down):
+    rows, width = trees
+    return sum(rows[row] >> (right*(i+1) % width) & 1 for i, row in enumerate(range(down, len(rows), down)))
+
+def get_grid_size(trees):
+    return sys.getsizeof(trees) + sum(sys.getsizeof(row) for row in trees) # Bools are shared singletons.
+
+def get_packed_size(trees):
+    return sys.getsizeof(trees.rows) + sum(sys.getsizeof(row) for row in trees.rows)
+
+def benchmark():
+    rng = random.Random(3)
+    slopes = [(right, down) for right in range(1, 101) for down in range(1, 11)]
+    for width, height in ((31, 323), (1000, 1000), (10000, 1000)):
+        lines = [''.join(rng.choice('..#') for _ in range(width)) for _ in range(height)]
+        grid = read_input(lines)
+        packed = read_input_packed(lines)
+        grid_time = timeit.timeit(lambda: [count_trees(grid, right, down) for right, down in slopes], number=1)
+        packed_time = timeit.timeit(lambda: [count_trees_packed(packed, right, down) for right, down in slopes], number=1)
+        print(f'{width}x{height}, {len(slopes)} slopes: '
+              f'grid {get_grid_size(grid)} bytes {grid_time:.3f}s, packed {get_packed_size(packed)} bytes {packed_time:.3f}s')
+
+def count_trees_for_slopes(lines, slopes):
+    counts = [0] * len(slopes)
+    width = None
+    for row, line in enumerate(lines):
+        line = line.rstrip()
+        if width is None:
+            width = len(line)
+        assert(len(line) == width)
+        if row == 0:
+            continue # Every slope starts on the first row without counting it.
+        for i, (right, down) in enumerate(slopes):
+            if row % down == 0:
+                counts[i] += line[right * (row // down) % width] == '#'
+    return counts
+
 class Test(unittest.TestCase):
     def test_count_trees(self):
         with open('test1.txt') as f:
@@ -27,14 +87,38 @@ class Test(unittest.TestCase):
             trees = read_input(f)
         self.assertEqual(count_trees(trees, 3, 1), 205)
 
+    def test_count_trees_packed(self):
+        slopes = [(1, 1), (3, 1), (5, 1), (7, 1), (1, 2)]
+        with open('test1.txt') as f:
+            trees = read_input_packed(f)
+        self.assertEqual([count_trees_packed(trees, right, down) for right, down in slopes], [2, 7, 3, 4, 2])
+
+        with open('input.txt') as f:
+            trees = read_input_packed(f)
+        self.assertEqual(count_trees_packed(trees, 3, 1), 205)
+
+    def test_count_trees_for_slopes(self):
+        slopes = [(1, 1), (3, 1), (5, 1), (7, 1), (1, 2)]
+        with open('test1.txt') as f:
+            self.assertEqual(count_trees_for_slopes(f, slopes), [2, 7, 3, 4, 2])
+
+        with open('input.txt') as f:
+            trees = read_input(f)
+        with open('input.txt') as f:
+            self.assertEqual(count_trees_for_slopes(f, slopes), [count_trees(trees, right, down) for right, down in slopes])
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+        sys.exit()
+
     unittest.main(exit=False)
 
+    slopes = ((1, 1), (3, 1), (5, 1), (7, 1), (1, 2))
     with open('input.txt') as f:
-        trees = read_input(f)
+        counts = count_trees_for_slopes(f, slopes)
 
-    counts = ((1, 1), (3, 1), (5, 1), (7, 1), (1, 2))
     product = 1
-    for i, j in counts:
-        product *= count_trees(trees, i, j)
+    for count in counts:
+        product *= count
     print(product)
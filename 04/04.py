@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 
+import multiprocessing
+import os
 import re
+import sys
+import time
 import unittest
 
 def parse_passport(s):
@@ -10,56 +14,159 @@ def parse_passport(s):
         passport[k] = v
     return passport
 
-def read_input(f):
-    def add_passport(passports, passport):
-        passports.append(passport.rstrip().replace('\n', ' '))
-    passports = []
-    passport = ''
-    for line in f:
+def iter_records(lines):
+    """Yields the lines of each blank-line-separated record, holding only one record at a time."""
+    record = []
+    for line in lines:
         if line.isspace():
-            add_passport(passports, passport)
-            passport = ''
+            if record:
+                yield record
+            record = []
         else:
-            passport += line
+            record.append(line)
+    if record: # We won't see an empty line before EOF, so yield the last record.
+        yield record
+
+def iter_passports(f):
+    for record in iter_records(f):
+        passport = {}
+        for line in record:
+            for token in line.split():
+                k, v = token.split(':')
+                passport[k] = v
+        yield passport
+
+def read_input(f):
+    return list(iter_passports(f))
+
+# Required fields and their rules. cid is optional, so it isn't listed.
+passport_schema = {
+    'byr': {'range': (1920, 2002)},
+    'iyr': {'range': (2010, 2020)},
+    'eyr': {'range': (2020, 2030)},
+    'hgt': {'pattern': '([0-9]+)(cm|in)', 'units': {'cm': (150, 193), 'in': (59, 76)}},
+    'hcl': {'pattern': '#[0-9a-f]{6}'},
+    'ecl': {'values': ['amb', 'blu', 'brn', 'gry', 'grn', 'hzl', 'oth']},
+    'pid': {'pattern': '[0-9]{9}'},
+}
+
+def compile_field_rule(rule):
+    if 'range' in rule:
+        low, high = rule['range']
+        def check(value):
+            try:
+                return low <= int(value) <= high
+            except ValueError:
+                return False
+    elif 'values' in rule:
+        values = frozenset(rule['values'])
+        check = values.__contains__
+    elif 'units' in rule:
+        pattern = re.compile(rule['pattern'])
+        units = rule['units']
+        def check(value):
+            match = pattern.fullmatch(value)
+            if not match:
+                return False
+            low, high = units[match.group(2)]
+            return low <= int(match.group(1)) <= high
+    else:
+        pattern = re.compile(rule['pattern'])
+        def check(value):
+            return pattern.fullmatch(value) is not None
+    return check
 
-    if passport: # We won't see an empty line before EOF, so add the last passport.
-            add_passport(passports, passport)
-    return list(map(parse_passport, passports))
+def compile_schema(schema, presence_only=False):
+    if presence_only:
+        fields = tuple(schema)
+        def validate(passport):
+            return all(field in passport for field in fields)
+    else:
+        checks = [(field, compile_field_rule(rule)) for field, rule in schema.items()]
+        def validate(passport):
+            for field, check in checks:
+                value = passport.get(field)
+                if value is None or not check(value):
+                    return False
+            return True
+    return validate
+
+validate_passport = compile_schema(passport_schema)
 
 def passport_is_valid(passport):
-    try:
-        if not 1920 <= int(passport['byr']) <= 2002:
-            return False
-        if not 2010 <= int(passport['iyr']) <= 2020:
-            return False
-        if not 2020 <= int(passport['eyr']) <= 2030:
-            return False
-        hgt_match = re.fullmatch('([0-9]+)(cm|in)', passport['hgt'])
-        if not hgt_match:
-            return False
-        if hgt_match.group(2) == 'cm' and not 150 <= int(hgt_match.group(1)) <= 193:
-            return False
-        if hgt_match.group(2) == 'in' and not 59 <= int(hgt_match.group(1)) <= 76:
-            return False
-        if not re.fullmatch('#[0-9a-f]{6}', passport['hcl']):
-            return False
-        if not passport['ecl'] in ['amb', 'blu', 'brn', 'gry', 'grn', 'hzl', 'oth']:
-            return False
-        if not re.fullmatch('[0-9]{9}', passport['pid']):
-            return False
-        # Ignore cid
-        return True
-    except (KeyError, ValueError):
-        return False
+    return validate_passport(passport)
+
+worker_validate = None
+
+def init_worker(schema, presence_only):
+    global worker_validate
+    worker_validate = compile_schema(schema, presence_only)
+
+def validate_chunk(chunk):
+    return list(map(worker_validate, chunk))
+
+def validate_passports(passports, schema=passport_schema, presence_only=False, processes=None, chunk_size=10000):
+    if processes == 1 or len(passports) <= chunk_size:
+        return list(map(compile_schema(schema, presence_only), passports))
+    chunks = (passports[i:i+chunk_size] for i in range(0, len(passports), chunk_size))
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(schema, presence_only)) as pool:
+        return [valid for chunk in pool.imap(validate_chunk, chunks) for valid in chunk]
+
+def benchmark():
+    with open('input.txt') as f:
+        passports = read_input(f) * 1000
+    for presence_only in (True, False):
+        for processes in (1, None):
+            start = time.perf_counter()
+            validate_passports(passports, presence_only=presence_only, processes=processes)
+            elapsed = time.perf_counter() - start
+            mode = 'presence' if presence_only else 'full'
+            print(f'{mode}, processes={processes or os.cpu_count()}: {len(passports) / elapsed:.0f} passports/s')
 
 class Test(unittest.TestCase):
+    def test_iter_records(self):
+        lines = ['a\n', 'b\n', '\n', 'c\n', '\n', '\n', 'd e\n']
+        self.assertEqual(list(iter_records(lines)), [['a\n', 'b\n'], ['c\n'], ['d e\n']])
+        self.assertEqual(list(iter_records([])), [])
+
+    def test_iter_passports(self):
+        with open('test1.txt') as f:
+            passports = list(iter_passports(f))
+        self.assertEqual(len(passports), 8)
+        self.assertEqual(passports[-1], parse_passport('iyr:2010 hgt:158cm hcl:#b6652a ecl:blu byr:1944 eyr:2021 pid:093154719'))
+
     def test_passport_is_valid(self):
         with open('test1.txt') as f:
             passports = read_input(f)
         valid = list(map(passport_is_valid, passports))
         self.assertEqual(valid, [False]*4 + [True]*4)
 
+    def test_compile_schema(self):
+        with open('input.txt') as f:
+            passports = read_input(f)
+        presence = compile_schema(passport_schema, presence_only=True)
+        exp = [all(field in passport for field in ['byr', 'iyr', 'eyr', 'hgt', 'hcl', 'ecl', 'pid']) for passport in passports]
+        self.assertEqual(list(map(presence, passports)), exp)
+
+        full = compile_schema(passport_schema)
+        self.assertFalse(full({**passports[0], 'hgt': '190'}))
+        self.assertFalse(full({**passports[0], 'hgt': '80in'}))
+        self.assertFalse(full({**passports[0], 'ecl': 'xyz'}))
+
+    def test_validate_passports(self):
+        with open('input.txt') as f:
+            passports = read_input(f)
+        for presence_only in (True, False):
+            serial = validate_passports(passports, presence_only=presence_only, processes=1)
+            parallel = validate_passports(passports, presence_only=presence_only, processes=2, chunk_size=50)
+            self.assertEqual(parallel, serial)
+        self.assertEqual(serial, list(map(passport_is_valid, passports)))
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+        sys.exit()
+
     unittest.main(exit=False)
 
     with open('input.txt') as f:
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 
+import re
 import unittest
+from io import StringIO
 
 class Seat:
     def __init__(self, row, col):
@@ -31,6 +33,41 @@ def parse_seat(s):
 def parse_input(f):
     return list(map(parse_seat, f))
 
+seat_bits = str.maketrans('FBLR', '0101')
+boarding_pass_pattern = re.compile(r'[FB]{7}[LR]{3}')
+
+def decode_seat_ids(f):
+    # A seat ID is row * 8 + col, which is just the whole pass read as one 10-bit binary number.
+    # Splitting on whitespace tolerates CRLF line endings and trailing blank lines.
+    passes = f.read().split()
+    if not all(boarding_pass_pattern.fullmatch(p) for p in passes):
+        raise Exception('invalid boarding pass input')
+    return [int(p.translate(seat_bits), 2) for p in passes]
+
+def get_occupancy(seat_ids):
+    occupancy = 0
+    for seat_id in seat_ids:
+        occupancy |= 1 << seat_id
+    return occupancy
+
+def find_missing_seats(occupancy):
+    # Every empty seat between the lowest and highest occupied seat.
+    if not occupancy:
+        return []
+    lowest = (occupancy & -occupancy).bit_length() - 1
+    highest = occupancy.bit_length() - 1
+    between = ((1 << highest) - 1) ^ ((1 << (lowest + 1)) - 1)
+    missing = ~occupancy & between
+    seats = []
+    while missing:
+        lowest = missing & -missing
+        seats.append(lowest.bit_length() - 1)
+        missing ^= lowest
+    return seats
+
+def find_missing_seats_for_manifests(manifests):
+    return [find_missing_seats(get_occupancy(decode_seat_ids(f))) for f in manifests]
+
 class Test(unittest.TestCase):
     def test_parse_seat(self):
         cases = [
@@ -44,17 +81,27 @@ class Test(unittest.TestCase):
             self.assertEqual(seat, case[1])
             self.assertEqual(seat.seat_id(), case[2])
 
+    def test_decode_seat_ids(self):
+        self.assertEqual(decode_seat_ids(StringIO('FBFBBFFRLR\nBFFFBBFRRR\nFFFBBBFRRR\nBBFFBBFRLL')), [357, 567, 119, 820])
+        with self.assertRaises(Exception):
+            decode_seat_ids(StringIO('FBFBBFFRLR\nFBFBBFFRLX\n'))
+        self.assertEqual(decode_seat_ids(StringIO('FBFBBFFRLR\r\nBFFFBBFRRR\r\n\n')), [357, 567])
+
+        with open('input.txt') as f:
+            seats = parse_input(f)
+        with open('input.txt') as f:
+            self.assertEqual(decode_seat_ids(f), [seat.seat_id() for seat in seats])
+
+    def test_find_missing_seats(self):
+        self.assertEqual(find_missing_seats(get_occupancy([3, 5, 6, 8, 10])), [4, 7, 9])
+        self.assertEqual(find_missing_seats(get_occupancy([3, 4, 7, 8])), [5, 6])
+        self.assertEqual(find_missing_seats(get_occupancy([10, 2])), [3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(find_missing_seats(get_occupancy([5])), [])
+        self.assertEqual(find_missing_seats(get_occupancy([])), [])
+        manifests = [StringIO('FFFFFFFLLL\nFFFFFFFLRL\n'), StringIO('FFFFFFFLLR\n')]
+        self.assertEqual(find_missing_seats_for_manifests(manifests), [[1], []])
+
 if __name__ == '__main__':
     unittest.main(exit=False)
     with open('input.txt') as f:
-        seats = parse_input(f)
-
-    seat_ids = [s.seat_id() for s in seats]
-    min_seat_id = min(seat_ids)
-    max_seat_id = max(seat_ids)
-
-    # Magic interview trick to get missing number: add numbers and subtract from expected sum.
-    expected_sum = ((max_seat_id * (max_seat_id+1)) - ((min_seat_id-1) * (min_seat_id))) // 2
-    actual_sum = sum(seat_ids)
-    missing = expected_sum - actual_sum
-    print(missing)
+        print(find_missing_seats_for_manifests([f])[0][0])
@@ -21,6 +21,36 @@ def get_union_count(group):
 def get_intersection_count(group):
     return len(set.intersection(*map(set, group)))
 
+def get_answer_mask(line):
+    mask = 0
+    for c in line.rstrip():
+        mask |= 1 << (ord(c) - ord('a'))
+    return mask
+
+def count_bits(mask):
+    return bin(mask).count('1')
+
+def get_union_and_intersection_totals(f):
+    union_total = 0
+    intersection_total = 0
+    union = 0
+    intersection = None # No one in the current group yet.
+    for line in f:
+        if line.isspace():
+            if intersection is not None:
+                union_total += count_bits(union)
+                intersection_total += count_bits(intersection)
+            union = 0
+            intersection = None
+        else:
+            mask = get_answer_mask(line)
+            union |= mask
+            intersection = mask if intersection is None else intersection & mask
+    if intersection is not None: # No blank line before EOF, so add final group.
+        union_total += count_bits(union)
+        intersection_total += count_bits(intersection)
+    return union_total, intersection_total
+
 class Test(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -39,9 +69,19 @@ class Test(unittest.TestCase):
         intersection_count = list(map(get_intersection_count, self.test1groups))
         self.assertEqual(intersection_count, [3, 0, 1, 1, 1])
 
+    def test_get_union_and_intersection_totals(self):
+        with open('test1.txt') as f:
+            self.assertEqual(get_union_and_intersection_totals(f), (11, 6))
+
+        with open('input.txt') as f:
+            groups = parse_input(f)
+        with open('input.txt') as f:
+            totals = get_union_and_intersection_totals(f)
+        self.assertEqual(totals, (sum(map(get_union_count, groups)), sum(map(get_intersection_count, groups))))
+
 if __name__ == '__main__':
     unittest.main(exit=False)
     with open('input.txt') as f:
-        groups = parse_input(f)
+        _, intersection_total = get_union_and_intersection_totals(f)
 
-    print(sum(map(get_intersection_count, groups)))
+    print(intersection_total)
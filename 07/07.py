@@ -2,7 +2,9 @@
 
 import re
 import unittest
-from collections import namedtuple
+from array import array
+from collections import defaultdict, deque, namedtuple
+from io import StringIO
 
 RuleChild = namedtuple('RuleChild', ['bag_type', 'count'])
 
@@ -35,6 +37,193 @@ def can_contain(rules, parent, child):
 def contained_bags(rules, bag_type):
     return sum(child.count + child.count * contained_bags(rules, child.bag_type) for child in rules[bag_type])
 
+class RuleGraph:
+    def __init__(self, rules):
+        self.rules = {k: list(v) for k, v in rules.items()}
+        self.parents = defaultdict(set) # child bag type -> bag types that directly contain it
+        for parent, children in rules.items():
+            for child in children:
+                self.parents[child.bag_type].add(parent)
+        self.contained_counts = {}
+        self.ancestor_sets = {}
+
+    def find_ancestors(self, bag_type):
+        ancestors = set()
+        queue = deque([bag_type])
+        while queue:
+            for parent in self.parents.get(queue.popleft(), ()):
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    queue.append(parent)
+        return ancestors
+
+    def find_descendants(self, bag_types):
+        descendants = set(bag_types)
+        queue = deque(bag_types)
+        while queue:
+            for child in self.rules.get(queue.popleft(), []):
+                if child.bag_type not in descendants:
+                    descendants.add(child.bag_type)
+                    queue.append(child.bag_type)
+        return descendants
+
+    def get_ancestors(self, bag_type):
+        ancestors = self.ancestor_sets.get(bag_type)
+        if ancestors is None:
+            ancestors = self.ancestor_sets[bag_type] = frozenset(self.find_ancestors(bag_type))
+        return ancestors
+
+    def set_rule(self, bag_type, children):
+        old_children = self.rules.get(bag_type, [])
+        self.rules[bag_type] = children
+        self.update_edges(bag_type, old_children, children)
+
+    def delete_rule(self, bag_type):
+        self.update_edges(bag_type, self.rules.pop(bag_type), [])
+
+    def update_edges(self, bag_type, old_children, new_children):
+        old_types = {child.bag_type for child in old_children}
+        new_types = {child.bag_type for child in new_children}
+        for child in old_types - new_types:
+            self.parents[child].discard(bag_type)
+        for child in new_types - old_types:
+            self.parents[child].add(bag_type)
+
+        # Only this bag's count and the counts of bags that can hold it depend on its rule.
+        self.contained_counts.pop(bag_type, None)
+        if self.contained_counts:
+            for ancestor in self.find_ancestors(bag_type):
+                self.contained_counts.pop(ancestor, None)
+
+        # Added or removed edges change the ancestors of everything at or below the affected children.
+        changed_types = old_types ^ new_types
+        if changed_types and self.ancestor_sets:
+            for descendant in self.find_descendants(changed_types):
+                self.ancestor_sets.pop(descendant, None)
+
+    def contained_bags(self, bag_type):
+        # Iterative post-order walk so deep rule chains don't hit the recursion limit.
+        counts = self.contained_counts
+        expanding = set()
+        stack = [bag_type]
+        while stack:
+            bag = stack[-1]
+            if bag in counts:
+                stack.pop()
+                continue
+            children = self.rules.get(bag, [])
+            pending = [child.bag_type for child in children if child.bag_type not in counts]
+            if pending:
+                if any(child in expanding for child in pending):
+                    raise Exception(f'rules contain a cycle through "{bag}"')
+                expanding.add(bag)
+                stack.extend(pending)
+            else:
+                counts[bag] = sum(child.count + child.count * counts[child.bag_type] for child in children)
+                expanding.discard(bag)
+                stack.pop()
+        return counts[bag_type]
+
+rule_pattern = re.compile(r'(.+?) bags? contain (.+)')
+child_pattern = re.compile(r'([0-9]+) (.+?) bags?(?:[,.]|$)')
+children_pattern = re.compile(r'[0-9]+ [^,]+? bags?(?:, [0-9]+ [^,]+? bags?)*\.')
+
+def build_csr(num_nodes, sources, targets, weights):
+    # Counting sort of the edges by source node.
+    offsets = array('l', [0]) * (num_nodes + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for i in range(num_nodes):
+        offsets[i + 1] += offsets[i]
+    next_slot = array('l', offsets[:-1])
+    sorted_targets = array('l', [0]) * len(targets)
+    sorted_weights = array('l', [0]) * len(weights)
+    for source, target, weight in zip(sources, targets, weights):
+        slot = next_slot[source]
+        sorted_targets[slot] = target
+        sorted_weights[slot] = weight
+        next_slot[source] += 1
+    return offsets, sorted_targets, sorted_weights
+
+class CompactRuleGraph:
+    """Rules with bag types interned to dense IDs and stored as compressed sparse row arrays."""
+
+    def __init__(self, names, offsets, child_ids, counts):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.child_ids = child_ids
+        self.counts = counts
+        parent_ids = array('l', (bag for bag in range(len(names)) for _ in range(offsets[bag], offsets[bag + 1])))
+        self.parent_offsets, self.parent_ids, _ = build_csr(len(names), child_ids, parent_ids, counts)
+
+    def get_ancestors(self, bag_type):
+        offsets, parent_ids = self.parent_offsets, self.parent_ids
+        seen = bytearray(len(self.names))
+        queue = deque([self.ids[bag_type]])
+        while queue:
+            bag = queue.popleft()
+            for i in range(offsets[bag], offsets[bag + 1]):
+                parent = parent_ids[i]
+                if not seen[parent]:
+                    seen[parent] = 1
+                    queue.append(parent)
+        return {self.names[bag] for bag in range(len(seen)) if seen[bag]}
+
+    def contained_bags(self, bag_type):
+        offsets, child_ids, counts = self.offsets, self.child_ids, self.counts
+        totals = [None] * len(self.names)
+        expanding = bytearray(len(self.names))
+        stack = [self.ids[bag_type]]
+        while stack:
+            bag = stack[-1]
+            if totals[bag] is not None:
+                stack.pop()
+                continue
+            children = range(offsets[bag], offsets[bag + 1])
+            pending = [child_ids[i] for i in children if totals[child_ids[i]] is None]
+            if pending:
+                if any(expanding[child] for child in pending):
+                    raise Exception(f'rules contain a cycle through "{self.names[bag]}"')
+                expanding[bag] = 1
+                stack.extend(pending)
+            else:
+                totals[bag] = sum(counts[i] + counts[i] * totals[child_ids[i]] for i in children)
+                expanding[bag] = 0
+                stack.pop()
+        return totals[self.ids[bag_type]]
+
+def parse_input_compact(f):
+    ids = {}
+    names = []
+    def intern(name):
+        bag = ids.get(name)
+        if bag is None:
+            bag = ids[name] = len(names)
+            names.append(name)
+        return bag
+
+    parents = array('l')
+    children = array('l')
+    counts = array('l')
+    for line in f:
+        line = line.rstrip()
+        match = rule_pattern.fullmatch(line)
+        if not match:
+            raise Exception(f'invalid input line: "{line}"')
+        parent = intern(match.group(1))
+        if match.group(2) == 'no other bags.':
+            continue
+        # findall would silently skip children it can't parse, so the whole clause has to match first.
+        if not children_pattern.fullmatch(match.group(2)):
+            raise Exception(f'invalid input line: "{line}"')
+        for count, child in child_pattern.findall(match.group(2)):
+            parents.append(parent)
+            children.append(intern(child))
+            counts.append(int(count))
+
+    return CompactRuleGraph(names, *build_csr(len(names), parents, children, counts))
+
 class Test(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -70,9 +259,74 @@ class Test(unittest.TestCase):
             rules = parse_input(f)
         self.assertEqual(contained_bags(rules, 'shiny gold'), 126)
 
+    def test_parse_input_compact(self):
+        with open('test1.txt') as f:
+            graph = parse_input_compact(f)
+        self.assertEqual(set(graph.names), set(self.test1rules))
+        for bag_type, children in self.test1rules.items():
+            bag = graph.ids[bag_type]
+            compact_children = [RuleChild(graph.names[graph.child_ids[i]], graph.counts[i]) for i in range(graph.offsets[bag], graph.offsets[bag + 1])]
+            self.assertEqual(compact_children, children)
+        self.assertEqual(graph.get_ancestors('shiny gold'), {'bright white', 'muted yellow', 'dark orange', 'light red'})
+
+        with open('test2.txt') as f:
+            self.assertEqual(parse_input_compact(f).contained_bags('shiny gold'), 126)
+        with self.assertRaises(Exception):
+            parse_input_compact(StringIO('light red bags contain 1 bright white bag, two muted yellow bags.\n'))
+
+        with open('input.txt') as f:
+            graph = RuleGraph(parse_input(f))
+        with open('input.txt') as f:
+            compact = parse_input_compact(f)
+        for bag_type in ['shiny gold', 'light red', compact.names[-1]]:
+            self.assertEqual(compact.get_ancestors(bag_type), graph.get_ancestors(bag_type))
+            self.assertEqual(compact.contained_bags(bag_type), graph.contained_bags(bag_type))
+
+    def test_rule_graph_updates(self):
+        rules = self.test1rules
+        graph = RuleGraph(rules)
+        for bag_type in rules:
+            graph.get_ancestors(bag_type)
+            graph.contained_bags(bag_type)
+
+        graph.set_rule('vibrant plum', [RuleChild('faded blue', 1)])
+        self.assertEqual(set(graph.contained_counts), set(rules) - {'vibrant plum', 'shiny gold', 'bright white', 'muted yellow', 'light red', 'dark orange'})
+        self.assertEqual(set(graph.ancestor_sets), set(rules) - {'dotted black'})
+
+        graph.set_rule('plaid red', [RuleChild('shiny gold', 3)])
+        graph.delete_rule('light red')
+        graph.set_rule('faded blue', [RuleChild('dotted black', 2)])
+        self.assertIn('light red', rules)
+        self.assertNotIn('plaid red', rules)
+        fresh = RuleGraph(graph.rules)
+        for bag_type in list(graph.rules) + ['light red']:
+            self.assertEqual(graph.get_ancestors(bag_type), fresh.get_ancestors(bag_type), msg=f'failed for {bag_type}')
+            self.assertEqual(graph.contained_bags(bag_type), fresh.contained_bags(bag_type), msg=f'failed for {bag_type}')
+
+    def test_rule_graph(self):
+        graph = RuleGraph(self.test1rules)
+        self.assertEqual(graph.get_ancestors('shiny gold'), {'bright white', 'muted yellow', 'dark orange', 'light red'})
+        self.assertEqual(graph.get_ancestors('light red'), set())
+        for bag_type in self.test1rules:
+            self.assertEqual(graph.contained_bags(bag_type), contained_bags(self.test1rules, bag_type), msg=f'failed for {bag_type}')
+
+        with open('test2.txt') as f:
+            graph = RuleGraph(parse_input(f))
+        self.assertEqual(graph.contained_bags('shiny gold'), 126)
+
+        # A long chain would overflow the stack with recursion.
+        chain = {f'bag {i}': [RuleChild(f'bag {i+1}', 1)] for i in range(10**5)}
+        chain[f'bag {10**5}'] = []
+        graph = RuleGraph(chain)
+        self.assertEqual(graph.contained_bags('bag 0'), 10**5)
+        self.assertEqual(len(graph.get_ancestors(f'bag {10**5}')), 10**5)
+
+        with self.assertRaises(Exception):
+            RuleGraph({'a': [RuleChild('b', 1)], 'b': [RuleChild('a', 1)]}).contained_bags('a')
+
 if __name__ == '__main__':
     unittest.main(exit=False)
 
     with open('input.txt') as f:
-        rules = parse_input(f)
-    print(contained_bags(rules, 'shiny gold'))
+        graph = parse_input_compact(f)
+    print(graph.contained_bags('shiny gold'))
@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
 
+import random
+import sys
+import time
+import timeit
 import unittest
-from collections import namedtuple
+from array import array
+from collections import Counter, namedtuple
 
 Instruction = namedtuple('Instruction', ['opcode', 'argument'])
 
+ACC, JMP, NOP = range(3)
+opcodes = {'acc': ACC, 'jmp': JMP, 'nop': NOP}
+
+# Parallel arrays for the compiled program. acc_prefix[i] is the sum of acc arguments before i, and block_stops[i]
+# is the first jmp at or after i (or len(code)), so the straight-line run starting at i is i..block_stops[i]-1.
+CompiledCode = namedtuple('CompiledCode', ['opcodes', 'arguments', 'acc_prefix', 'block_stops'])
+
 def parse_line(line):
     splits = line.rstrip().split()
     return Instruction(splits[0], int(splits[1]))
@@ -12,14 +24,62 @@ def parse_line(line):
 def parse_input(f):
     return list(map(parse_line, f))
 
+# Where a run stands: enough to resume it later without replaying from pc 0.
+ProgramState = namedtuple('ProgramState', ['pc', 'accumulator', 'visited'])
+
+class ExecutionTrace:
+    """Collects per-pc counts, the instruction mix and loop details from traced runs. One trace can be shared by several runs."""
+
+    def __init__(self):
+        self.pc_counts = Counter()
+        self.opcode_counts = Counter()
+        self.steps = 0
+        self.elapsed = 0.0
+        self.loop_entry = None
+        self.cycle_length = None
+        self.terminated = None
+
+    def report(self, top=10):
+        return {
+            'steps': self.steps,
+            'elapsed_seconds': self.elapsed,
+            'seconds_per_step': self.elapsed / self.steps if self.steps else None,
+            'terminated': self.terminated,
+            'loop_entry': self.loop_entry,
+            'cycle_length': self.cycle_length,
+            'instruction_mix': dict(self.opcode_counts),
+            'hot_pcs': self.pc_counts.most_common(top),
+        }
+
 class Program:
-    def __init__(self, code):
+    def __init__(self, code, overrides=None, state=None, trace=None):
         self.code = code
-        self.accumulator = 0
-        self.pc = 0
+        self.overrides = overrides or {} # pc -> replacement instruction; code itself is never modified
+        self.trace = trace
+        if state is None:
+            self.accumulator = 0
+            self.pc = 0
+            self.visited = set()
+        else:
+            self.accumulator = state.accumulator
+            self.pc = state.pc
+            self.visited = set(state.visited)
+
+    def save_state(self):
+        return ProgramState(self.pc, self.accumulator, frozenset(self.visited))
+
+    def fork(self, overrides=None):
+        # The child keeps this program's patches, with any new ones layered on top.
+        return Program(self.code, {**self.overrides, **(overrides or {})}, self.save_state(), self.trace)
+
+    def get_instruction(self, pc):
+        instruction = self.overrides.get(pc)
+        if instruction is None:
+            instruction = self.code[pc]
+        return instruction
 
     def run_next_instruction(self):
-        instruction = self.code[self.pc]
+        instruction = self.get_instruction(self.pc)
         if instruction.opcode == 'acc':
             self.accumulator += instruction.argument
             self.pc += 1
@@ -31,33 +91,212 @@ class Program:
             raise Exception(f'invalid opcode: "{instruction.opcode}"')
 
     def check_for_infinite_loop(self):
-        instructions_seen = set()
+        if self.trace is not None:
+            return self.check_for_infinite_loop_traced()
         while True:
-            if self.pc in instructions_seen:
+            if self.pc in self.visited:
                 return True
             elif self.pc == len(self.code):
                 return False
-            instructions_seen.add(self.pc)
+            self.visited.add(self.pc)
             self.run_next_instruction()
 
-def find_corrupted_instruction(code_orig):
-    for i in range(len(code_orig)):
-        if code_orig[i].opcode not in ['jmp', 'nop']:
-            continue
+    def check_for_infinite_loop_traced(self):
+        # Kept separate so untraced runs pay nothing for tracing.
+        trace = self.trace
+        first_step = {}
+        start = time.perf_counter()
+        while True:
+            if self.pc in self.visited:
+                infinite = True
+                trace.loop_entry = self.pc
+                trace.cycle_length = trace.steps - first_step[self.pc] if self.pc in first_step else None
+                break
+            elif self.pc == len(self.code):
+                infinite = False
+                trace.loop_entry = None
+                trace.cycle_length = None
+                break
+            first_step[self.pc] = trace.steps
+            trace.steps += 1
+            trace.pc_counts[self.pc] += 1
+            trace.opcode_counts[self.get_instruction(self.pc).opcode] += 1
+            self.visited.add(self.pc)
+            self.run_next_instruction()
+        trace.elapsed += time.perf_counter() - start
+        trace.terminated = not infinite
+        return infinite
+
+def compile_code(code):
+    ops = array('b')
+    arguments = array('l')
+    for instruction in code:
+        op = opcodes.get(instruction.opcode)
+        if op is None:
+            raise Exception(f'invalid opcode: "{instruction.opcode}"')
+        ops.append(op)
+        arguments.append(instruction.argument)
 
-        code = code_orig.copy()
-        if code[i].opcode == 'jmp':
-            code[i] = Instruction('nop', code[i].argument)
-        elif code[i].opcode == 'nop':
-            code[i] = Instruction('jmp', code[i].argument)
+    acc_prefix = [0] * (len(code) + 1)
+    for i in range(len(code)):
+        acc_prefix[i+1] = acc_prefix[i] + (arguments[i] if ops[i] == ACC else 0)
 
-        program = Program(code)
+    block_stops = array('l', [len(code)]) * len(code)
+    stop = len(code)
+    for i in reversed(range(len(code))):
+        if ops[i] == JMP:
+            stop = i
+        block_stops[i] = stop
+    return CompiledCode(ops, arguments, acc_prefix, block_stops)
+
+class CompiledProgram:
+    """Runs pre-decoded code, optionally executing each straight-line acc/nop run as a single step."""
+
+    def __init__(self, code, basic_blocks=False):
+        self.code = code if isinstance(code, CompiledCode) else compile_code(code)
+        self.basic_blocks = basic_blocks
+        self.accumulator = 0
+        self.pc = 0
+
+    def check_for_infinite_loop(self):
+        if self.basic_blocks:
+            return self.check_for_infinite_loop_blocks()
+        ops, arguments = self.code.opcodes, self.code.arguments
+        end = len(ops)
+        seen = bytearray(end)
+        pc = self.pc
+        accumulator = self.accumulator
+        while pc != end and not seen[pc]:
+            seen[pc] = 1
+            op = ops[pc]
+            if op == ACC:
+                accumulator += arguments[pc]
+                pc += 1
+            elif op == JMP:
+                pc += arguments[pc]
+            else:
+                pc += 1
+        self.pc = pc
+        self.accumulator = accumulator
+        return pc != end
+
+    def check_for_infinite_loop_blocks(self):
+        arguments, acc_prefix, block_stops = self.code.arguments, self.code.acc_prefix, self.code.block_stops
+        end = len(arguments)
+        seen = bytearray(end)
+        pc = self.pc
+        accumulator = self.accumulator
+        while pc != end:
+            stop = block_stops[pc]
+            last = min(stop + 1, end) # Include the jmp that ends the run.
+            repeat = seen.find(1, pc, last)
+            if repeat != -1: # Loop detected partway through the run.
+                accumulator += acc_prefix[repeat] - acc_prefix[pc]
+                pc = repeat
+                break
+            seen[pc:last] = bytes([1]) * (last - pc)
+            accumulator += acc_prefix[stop] - acc_prefix[pc]
+            pc = stop if stop == end else stop + arguments[stop]
+        self.pc = pc
+        self.accumulator = accumulator
+        return pc != end
+
+def generate_code(size, rng):
+    # Mostly straight-line code with short forward jumps, ending in a jump back to the start.
+    code = []
+    for i in range(size - 1):
+        r = rng.random()
+        if r < 0.1:
+            code.append(Instruction('jmp', rng.randrange(1, 4)))
+        elif r < 0.6:
+            code.append(Instruction('acc', rng.randrange(-50, 50)))
+        else:
+            code.append(Instruction('nop', rng.randrange(-50, 50)))
+    code.append(Instruction('jmp', -(size - 1)))
+    return code
+
+def benchmark():
+    rng = random.Random(8)
+    for size in (10**5, 10**6, 3 * 10**6):
+        code = generate_code(size, rng)
+        compiled = compile_code(code)
+        compile_time = timeit.timeit(lambda: compile_code(code), number=1)
+        times = [
+            ('Program', timeit.timeit(lambda: Program(code).check_for_infinite_loop(), number=1)),
+            ('compiled', timeit.timeit(lambda: CompiledProgram(compiled).check_for_infinite_loop(), number=1)),
+            ('basic blocks', timeit.timeit(lambda: CompiledProgram(compiled, basic_blocks=True).check_for_infinite_loop(), number=1)),
+        ]
+        print(f'{size} instructions (compile {compile_time:.3f}s): ' + ', '.join(f'{name} {time:.3f}s' for name, time in times))
+
+def flip_instruction(instruction):
+    return Instruction('nop' if instruction.opcode == 'jmp' else 'jmp', instruction.argument)
+
+def find_corrupted_instruction_brute_force(code):
+    for i in range(len(code)):
+        if code[i].opcode not in ['jmp', 'nop']:
+            continue
+
+        program = Program(code, {i: flip_instruction(code[i])})
         infinite = program.check_for_infinite_loop()
         if not infinite:
             return (i, program.accumulator)
 
     return None
 
+def get_successor(instruction, pc, flipped=False):
+    if (instruction.opcode == 'jmp') != flipped:
+        return pc + instruction.argument
+    return pc + 1
+
+def find_terminating_instructions(code):
+    # Walk the reversed control-flow graph back from the end of the program.
+    end = len(code)
+    predecessors = [[] for _ in range(end + 1)]
+    for pc, instruction in enumerate(code):
+        successor = get_successor(instruction, pc)
+        if 0 <= successor <= end:
+            predecessors[successor].append(pc)
+    terminating = bytearray(end + 1)
+    terminating[end] = 1
+    stack = [end]
+    while stack:
+        for pc in predecessors[stack.pop()]:
+            if not terminating[pc]:
+                terminating[pc] = 1
+                stack.append(pc)
+    return terminating
+
+def find_corrupted_instruction(code):
+    # Only an instruction on the original (looping) path can be the corrupted one, and flipping it fixes the program
+    # exactly when the flipped successor already reaches the end under the original code.
+    end = len(code)
+    terminating = find_terminating_instructions(code)
+    seen = bytearray(end)
+    accumulators = {} # candidate pc -> accumulator before executing it
+    pc = 0
+    accumulator = 0
+    while 0 <= pc < end and not seen[pc]:
+        seen[pc] = 1
+        instruction = code[pc]
+        if instruction.opcode in ['jmp', 'nop']:
+            successor = get_successor(instruction, pc, flipped=True)
+            if 0 <= successor <= end and terminating[successor]:
+                accumulators[pc] = accumulator
+        elif instruction.opcode == 'acc':
+            accumulator += instruction.argument
+        pc = get_successor(instruction, pc)
+
+    if pc == end or not accumulators:
+        return None # Nothing to repair if the program already terminates.
+    corrupted = min(accumulators)
+    accumulator = accumulators[corrupted]
+    pc = get_successor(code[corrupted], corrupted, flipped=True)
+    while pc != end:
+        if code[pc].opcode == 'acc':
+            accumulator += code[pc].argument
+        pc = get_successor(code[pc], pc)
+    return (corrupted, accumulator)
+
 class Test(unittest.TestCase):
     def test_check_for_infinite_loop(self):
         with open('test1.txt') as f:
@@ -67,13 +306,118 @@ class Test(unittest.TestCase):
         self.assertEqual(infinite, True)
         self.assertEqual(program.accumulator, 5)
 
+    def test_overrides_and_fork(self):
+        with open('test1.txt') as f:
+            code = parse_input(f)
+        original = list(code)
+
+        program = Program(code, {7: Instruction('nop', -4)})
+        self.assertEqual(program.check_for_infinite_loop(), False)
+        self.assertEqual(program.accumulator, 8)
+        self.assertEqual(code, original)
+
+        # Run the original up to the corrupted jmp, then try both variants from there.
+        program = Program(code)
+        while program.pc != 7:
+            program.visited.add(program.pc)
+            program.run_next_instruction()
+        state = program.save_state()
+        fixed = Program(code, {7: Instruction('nop', -4)}, state)
+        self.assertEqual(fixed.check_for_infinite_loop(), False)
+        self.assertEqual(fixed.accumulator, 8)
+        unchanged = program.fork()
+        self.assertEqual(unchanged.check_for_infinite_loop(), True)
+        self.assertEqual(unchanged.accumulator, 5)
+        self.assertEqual(program.save_state(), state)
+
+        # Forking a patched program keeps its patches.
+        patched = Program(code, {7: Instruction('nop', -4)})
+        for _ in range(3):
+            patched.visited.add(patched.pc)
+            patched.run_next_instruction()
+        child = patched.fork()
+        self.assertEqual(child.overrides, {7: Instruction('nop', -4)})
+        self.assertEqual(child.check_for_infinite_loop(), False)
+        self.assertEqual(child.accumulator, 8)
+        grandchild = patched.fork({0: Instruction('jmp', 1)})
+        self.assertEqual(grandchild.overrides, {0: Instruction('jmp', 1), 7: Instruction('nop', -4)})
+        self.assertEqual(patched.overrides, {7: Instruction('nop', -4)})
+
+    def test_trace(self):
+        with open('test1.txt') as f:
+            code = parse_input(f)
+        trace = ExecutionTrace()
+        program = Program(code, trace=trace)
+        self.assertEqual(program.check_for_infinite_loop(), True)
+        self.assertEqual(program.accumulator, 5)
+        report = trace.report()
+        self.assertEqual(report['steps'], 7)
+        self.assertEqual(report['terminated'], False)
+        self.assertEqual(report['loop_entry'], 1)
+        self.assertEqual(report['cycle_length'], 6) # 1, 2, 6, 7, 3, 4
+        self.assertEqual(report['instruction_mix'], {'nop': 1, 'acc': 3, 'jmp': 3})
+
+        # A shared trace accumulates hot pcs across runs.
+        for i in (0, 2, 4, 7):
+            Program(code, {i: flip_instruction(code[i])} if i != 2 else None, trace=trace).check_for_infinite_loop()
+        report = trace.report(top=1)
+        self.assertEqual(report['terminated'], True)
+        self.assertEqual(report['loop_entry'], None)
+        self.assertEqual(report['hot_pcs'], [(0, 5)])
+
+    def test_compiled_program(self):
+        with open('test1.txt') as f:
+            code = parse_input(f)
+        for basic_blocks in (False, True):
+            program = CompiledProgram(code, basic_blocks)
+            self.assertEqual(program.check_for_infinite_loop(), True)
+            self.assertEqual(program.accumulator, 5)
+
+        rng = random.Random(0)
+        for _ in range(200):
+            code = [Instruction(rng.choice(['acc', 'jmp', 'nop']), rng.randrange(-5, 5) or 1) for _ in range(rng.randrange(1, 30))]
+            code.append(Instruction('nop', 0)) # Give most programs a way to reach the end.
+            code = [Instruction(op, arg) if 0 <= i + arg <= len(code) or op != 'jmp' else Instruction('nop', arg) for i, (op, arg) in enumerate(code)]
+            program = Program(code)
+            exp = program.check_for_infinite_loop()
+            for basic_blocks in (False, True):
+                compiled = CompiledProgram(code, basic_blocks)
+                self.assertEqual(compiled.check_for_infinite_loop(), exp)
+                self.assertEqual((compiled.pc, compiled.accumulator), (program.pc, program.accumulator), msg=f'code = {code}')
+
     def test_find_corrupted_instruction(self):
         with open('test1.txt') as f:
             code = parse_input(f)
         corrupted = find_corrupted_instruction(code)
         self.assertEqual(corrupted, (7, 8))
 
+        with open('input.txt') as f:
+            code = parse_input(f)
+        self.assertEqual(find_corrupted_instruction(code), find_corrupted_instruction_brute_force(code))
+
+        rng = random.Random(1)
+        for _ in range(300):
+            size = rng.randrange(1, 20)
+            code = [Instruction(rng.choice(['acc', 'jmp', 'nop']), rng.randrange(-size, size + 1)) for _ in range(size)]
+            code = [Instruction('nop', arg) if op == 'jmp' and not 0 <= i + arg <= size else Instruction(op, arg) for i, (op, arg) in enumerate(code)]
+            code = [Instruction('acc', arg) if op == 'nop' and not 0 <= i + arg <= size else Instruction(op, arg) for i, (op, arg) in enumerate(code)]
+            if not Program(code).check_for_infinite_loop():
+                self.assertIsNone(find_corrupted_instruction(code), msg=f'code = {code}') # Nothing to repair.
+                continue
+            self.assertEqual(find_corrupted_instruction(code), find_corrupted_instruction_brute_force(code), msg=f'code = {code}')
+
+        self.assertIsNone(find_corrupted_instruction([Instruction('nop', 0), Instruction('jmp', 1), Instruction('acc', 1)]))
+
+        # A 10^6 instruction loop that can be fixed at either end; the lower index wins.
+        size = 10**6
+        code = [Instruction('nop', size - 1)] + [Instruction('acc', 1)] * (size - 3) + [Instruction('jmp', -(size - 3)), Instruction('acc', 5)]
+        self.assertEqual(find_corrupted_instruction(code), (0, 5))
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['benchmark']:
+        benchmark()
+        sys.exit()
+
     unittest.main(exit=False)
 
     with open('input.txt') as f:
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
+import bisect
 import itertools
+import random
 import unittest
-from collections import deque
+from collections import Counter, defaultdict, deque
 
 def parse_input(f, preamble_size):
     preamble_lines = (next(f) for i in range(preamble_size))
@@ -16,14 +18,43 @@ def parse_input(f, preamble_size):
 def is_sum(preamble, n):
     return any(a + b == n for a, b in itertools.combinations(preamble, 2) if a != b)
 
+class SumWindow:
+    """The last len(preamble) numbers, with a value -> count multiset for constant-time lookups."""
+
+    def __init__(self, preamble):
+        self.values = deque(preamble)
+        self.counts = Counter(self.values)
+
+    def is_sum(self, n):
+        counts = self.counts
+        return any(n - a != a and n - a in counts for a in counts)
+
+    def push(self, n):
+        old = self.values.popleft()
+        if self.counts[old] == 1:
+            del self.counts[old] # Keep only values that are in the window.
+        else:
+            self.counts[old] -= 1
+        self.values.append(n)
+        self.counts[n] += 1
+
 def find_invalid_sum(preamble, sums):
+    window = SumWindow(preamble)
     for n in sums:
-        if not is_sum(preamble, n):
+        if not window.is_sum(n):
             return n
-        preamble.popleft()
-        preamble.append(n)
+        window.push(n)
 
-def find_contiguous_sum(ns, target):
+def iter_invalid_sums(numbers, preamble_size):
+    # Works on unbounded streams: only the window of the last preamble_size numbers is kept.
+    numbers = iter(numbers)
+    window = SumWindow(itertools.islice(numbers, preamble_size))
+    for position, n in enumerate(numbers, preamble_size):
+        if not window.is_sum(n):
+            yield position, n
+        window.push(n)
+
+def find_contiguous_sum_brute_force(ns, target):
     for start in range(len(ns)):
         for end in range(start+1, len(ns)):
             slice_ = ns[start:end+1]
@@ -33,6 +64,45 @@ def find_contiguous_sum(ns, target):
             elif sum_ > target:
                 break # Sum is too large, no need to continue with this starting index.
 
+# Ranges below are half-open (start, end) pairs over prefix sums, at least two numbers long, and the one returned
+# has the lowest start and then the lowest end.
+
+def find_range_two_pointer(prefix, target):
+    # Only valid for non-negative numbers, where the shortest matching end never moves left as start moves right.
+    end = 0
+    for start in range(len(prefix) - 1):
+        end = max(end, start + 2)
+        while end < len(prefix) and prefix[end] - prefix[start] < target:
+            end += 1
+        if end == len(prefix):
+            return None # Even the longest remaining range is too small.
+        if prefix[end] - prefix[start] == target:
+            return start, end
+    return None
+
+def find_range_hashed(prefix, positions, target):
+    for start in range(len(prefix) - 1):
+        ends = positions.get(prefix[start] + target)
+        if ends:
+            i = bisect.bisect_left(ends, start + 2)
+            if i < len(ends):
+                return start, ends[i]
+    return None
+
+def find_contiguous_sums(ns, targets):
+    prefix = list(itertools.accumulate(ns, initial=0))
+    if all(n >= 0 for n in ns):
+        ranges = [find_range_two_pointer(prefix, target) for target in targets]
+    else:
+        positions = defaultdict(list) # prefix sum -> ascending indices
+        for i, sum_ in enumerate(prefix):
+            positions[sum_].append(i)
+        ranges = [find_range_hashed(prefix, positions, target) for target in targets]
+    return [ns[range_[0]:range_[1]] if range_ else None for range_ in ranges]
+
+def find_contiguous_sum(ns, target):
+    return find_contiguous_sums(ns, [target])[0]
+
 class Test(unittest.TestCase):
     def test_is_sum(self):
         with open('test1.txt') as f:
@@ -42,6 +112,41 @@ class Test(unittest.TestCase):
             preamble.popleft()
             preamble.append(n)
 
+    def test_sum_window(self):
+        with open('test1.txt') as f:
+            preamble, sums = parse_input(f, 5)
+        window = SumWindow(preamble)
+        for n in sums:
+            self.assertEqual(window.is_sum(n), is_sum(preamble, n), f'n = {n}')
+            window.push(n)
+            preamble.popleft()
+            preamble.append(n)
+            self.assertEqual(list(window.values), list(preamble))
+
+        window = SumWindow([1, 1, 2])
+        self.assertFalse(window.is_sum(2)) # 1 + 1 uses two equal values.
+        self.assertTrue(window.is_sum(3))
+        window.push(5)
+        self.assertEqual(window.counts, Counter([1, 2, 5]))
+        window.push(7)
+        self.assertEqual(window.counts, Counter([2, 5, 7]))
+
+        with open('input.txt') as f:
+            preamble, sums = parse_input(f, 25)
+        self.assertEqual(find_invalid_sum(preamble, sums), 542529149)
+
+    def test_iter_invalid_sums(self):
+        with open('test1.txt') as f:
+            self.assertEqual(list(iter_invalid_sums(map(int, f), 5)), [(14, 127)])
+
+        with open('input.txt') as f:
+            position, n = next(iter_invalid_sums(map(int, f), 25))
+        self.assertEqual(n, 542529149)
+
+        # Powers of two are never the sum of two distinct earlier powers of two, on an endless stream.
+        invalid = iter_invalid_sums((2**i for i in itertools.count()), 3)
+        self.assertEqual(list(itertools.islice(invalid, 3)), [(3, 8), (4, 16), (5, 32)])
+
     def test_invalid_sum(self):
         with open('test1.txt') as f:
             preamble, sums = parse_input(f, 5)
@@ -54,6 +159,24 @@ class Test(unittest.TestCase):
         self.assertEqual(min(sum_range), 15)
         self.assertEqual(max(sum_range), 47)
 
+    def test_find_contiguous_sums(self):
+        with open('test1.txt') as f:
+            _, sums = parse_input(f, 0)
+        targets = list(range(0, 600, 7)) + [127]
+        self.assertEqual(find_contiguous_sums(sums, targets), [find_contiguous_sum_brute_force(sums, target) for target in targets])
+
+        rng = random.Random(0)
+        for _ in range(300):
+            ns = [rng.randrange(0, 10) for _ in range(rng.randrange(15))]
+            targets = list(range(30))
+            self.assertEqual(find_contiguous_sums(ns, targets), [find_contiguous_sum_brute_force(ns, target) for target in targets], f'ns = {ns}')
+
+        # With negative numbers, return the first start, then the first end.
+        self.assertEqual(find_contiguous_sum([5, -3, 1, 4, -2], 2), [5, -3])
+        self.assertEqual(find_contiguous_sum([1, -2, 5, -1, 7], 11), [5, -1, 7])
+        self.assertEqual(find_contiguous_sum([1, -2, 5, -1, 7], 12), None)
+        self.assertEqual(find_contiguous_sum([3, 0], 3), [3, 0])
+
 if __name__ == '__main__':
     unittest.main(exit=False)
 
@@ -2,47 +2,104 @@
 
 import operator
 import unittest
-from collections import Counter
+from collections import Counter, deque
 
 def parse_input(f):
     return set(map(int, f))
 
-max_joltage_difference = 3
+def parse_range_line(line):
+    first, _, last = line.strip().partition('-')
+    return int(first), int(last or first)
+
+def parse_range_input(f):
+    # Adapters given as sorted, non-overlapping inclusive ranges, one "first-last" (or single joltage) per line.
+    ranges = [parse_range_line(line) for line in f if not line.isspace()]
+    for (_, prev_last), (first, last) in zip([(None, 0)] + ranges, ranges):
+        if first > last or first <= prev_last:
+            raise Exception(f'ranges must be sorted, non-overlapping and above 0: "{first}-{last}"')
+    return ranges
+
+def get_ranges(adapters):
+    ranges = []
+    for joltage in sorted(adapters):
+        if ranges and ranges[-1][1] == joltage - 1:
+            ranges[-1] = (ranges[-1][0], joltage)
+        else:
+            ranges.append((joltage, joltage))
+    return ranges
 
-def find_next_adapter(adapters, joltage):
-    for difference in range(1, max_joltage_difference+1):
-        if joltage + difference in adapters:
-            return joltage + difference
+max_joltage_difference = 3
 
-def get_complete_adapter_chain(adapters):
-    chain = [0]
-    joltage = 0
-    while len(adapters) > 0:
-        joltage = find_next_adapter(adapters, joltage)
-        chain.append(joltage)
-        adapters.remove(joltage)
-    chain.append(joltage + max_joltage_difference)
+def get_complete_adapter_chain(adapters, max_joltage_difference=max_joltage_difference):
+    chain = [0] + sorted(adapters)
+    if any(b - a > max_joltage_difference for a, b in zip(chain, chain[1:])):
+        raise Exception('adapters can\'t all be chained')
+    chain.append(chain[-1] + max_joltage_difference)
     return chain
 
-def get_difference_distribution(adapters):
-    chain = get_complete_adapter_chain(adapters)
-    diffs = list(map(operator.sub, chain[1:], chain))
-    return Counter(diffs)
+def get_difference_distribution(adapters, max_joltage_difference=max_joltage_difference):
+    chain = get_complete_adapter_chain(adapters, max_joltage_difference)
+    return Counter(map(operator.sub, chain[1:], chain))
 
 def find_possible_next_adapters(adapters, joltage):
     return [next_joltage for next_joltage in range (joltage+1, joltage+max_joltage_difference+1) if next_joltage in adapters]
 
-def get_num_adapter_chains(adapters):
-    max_joltage = max(adapters)
-    paths = [1, 0, 0] # paths to joltage+diff
-    for joltage in range(max_joltage+1):
-        paths_to_current = paths.pop(0)
-        paths.append(0)
-        for diff in range(1, 4):
-            if joltage + diff in adapters:
-                paths[diff - 1] += paths_to_current
+def get_num_adapter_chains(adapters, max_joltage_difference=max_joltage_difference, modulus=None):
+    # Paths to each adapter only depend on adapters within max_joltage_difference below it, so keep just those.
+    window = deque([(0, 1)]) # (joltage, paths to joltage)
+    window_total = 1 # Sum of the paths in window.
+    paths_to_current = 0
+    for joltage in sorted(adapters):
+        if joltage <= 0:
+            continue # The outlet is already the start of every chain.
+        while window and window[0][0] < joltage - max_joltage_difference:
+            window_total -= window.popleft()[1]
+        paths_to_current = window_total
+        if modulus is not None:
+            paths_to_current %= modulus
+        window.append((joltage, paths_to_current))
+        window_total += paths_to_current
+        if modulus is not None:
+            window_total %= modulus
     return paths_to_current
 
+def multiply_matrices(a, b, modulus):
+    product = [[sum(x * y for x, y in zip(row, col)) for col in zip(*b)] for row in a]
+    if modulus is not None:
+        product = [[x % modulus for x in row] for row in product]
+    return product
+
+def multiply_matrix_vector(a, v, modulus):
+    product = [sum(x * y for x, y in zip(row, v)) for row in a]
+    if modulus is not None:
+        product = [x % modulus for x in product]
+    return product
+
+def power_matrix_vector(a, n, v, modulus):
+    # Applies a**n to v by repeated squaring.
+    while n:
+        if n & 1:
+            v = multiply_matrix_vector(a, v, modulus)
+        n >>= 1
+        if n:
+            a = multiply_matrices(a, a, modulus)
+    return v
+
+def get_num_adapter_chains_from_ranges(ranges, max_joltage_difference=max_joltage_difference, modulus=None):
+    # state[i] is the number of paths to joltage - i. Each adapter in a run applies the same step: the new count is
+    # the sum of the state (the tribonacci recurrence for a difference of 3), so a whole run is one matrix power.
+    if not ranges:
+        return 0 # No adapters means no chains, as in get_num_adapter_chains.
+    d = max_joltage_difference
+    step = [[1] * d] + [[int(col == row - 1) for col in range(d)] for row in range(1, d)]
+    state = [1] + [0] * (d - 1)
+    joltage = 0
+    for first, last in ranges:
+        gap = first - joltage - 1 # Joltages with no adapter have no paths to them.
+        state = ([0] * min(gap, d) + state)[:d]
+        state = power_matrix_vector(step, last - first + 1, state, modulus)
+        joltage = last
+    return state[0]
 
 class Test(unittest.TestCase):
     def test_get_complete_adapter_chain(self):
@@ -59,6 +116,40 @@ class Test(unittest.TestCase):
         with open('test2.txt') as f:
             adapters = parse_input(f)
         self.assertEqual(get_difference_distribution(adapters), Counter({1:22, 3:10}))
+        self.assertEqual(len(adapters), 31) # Adapters are left untouched.
+        self.assertEqual(get_difference_distribution({2, 4, 6}, max_joltage_difference=2), Counter({2:4}))
+
+    def test_parse_range_input(self):
+        self.assertEqual(parse_range_input(['1-3\n', '5\n', '7-7\n', '10-5000000\n']), [(1, 3), (5, 5), (7, 7), (10, 5000000)])
+        with self.assertRaises(Exception):
+            parse_range_input(['1-5\n', '5-8\n'])
+        with self.assertRaises(Exception):
+            parse_range_input(['6-5\n'])
+
+    def test_get_num_adapter_chains_from_ranges(self):
+        for filename in ['test1.txt', 'test2.txt', 'input.txt']:
+            with open(filename) as f:
+                adapters = parse_input(f)
+            self.assertEqual(get_num_adapter_chains_from_ranges(get_ranges(adapters)), get_num_adapter_chains(adapters), filename)
+
+        for d in range(1, 6):
+            for ranges in ([(1, 20)], [(2, 9), (12, 30), (33, 33), (35, 41)], [(1, 5), (20, 25)]):
+                adapters = {joltage for first, last in ranges for joltage in range(first, last + 1)}
+                exp = get_num_adapter_chains(adapters, d, 1000)
+                self.assertEqual(get_num_adapter_chains_from_ranges(ranges, d, 1000), exp, f'd = {d}, ranges = {ranges}')
+
+        modulus = 10**9 + 7
+        ranges = [(1, 10**5), (10**5 + 3, 2 * 10**5)]
+        adapters = {joltage for first, last in ranges for joltage in range(first, last + 1)}
+        self.assertEqual(get_num_adapter_chains_from_ranges(ranges, modulus=modulus), get_num_adapter_chains(adapters, modulus=modulus))
+
+        self.assertEqual(get_num_adapter_chains_from_ranges([]), 0)
+        self.assertEqual(get_num_adapter_chains(set()), 0)
+        self.assertEqual(get_num_adapter_chains_from_ranges(get_ranges(set())), get_num_adapter_chains(set()))
+
+        # 10**9 adapters without enumerating them.
+        ranges = [(1, 10**9 // 2), (10**9 // 2 + 3, 10**9 + 2)]
+        self.assertLess(get_num_adapter_chains_from_ranges(ranges, modulus=modulus), modulus)
 
     def test_get_num_adapter_chains(self):
         with open('test1.txt') as f:
@@ -68,6 +159,20 @@ class Test(unittest.TestCase):
         with open('test2.txt') as f:
             adapters = parse_input(f)
         self.assertEqual(get_num_adapter_chains(adapters), 19208)
+        self.assertEqual(get_num_adapter_chains(adapters, modulus=1000), 208)
+
+        # Only as many steps as there are adapters, however large their joltages.
+        self.assertEqual(get_num_adapter_chains({10**9, 10**9 + 1}), 0)
+        self.assertEqual(get_num_adapter_chains({1, 2, 3, 10**9}), 0)
+        self.assertEqual(get_num_adapter_chains({10**9 * i for i in range(1, 10**5)}, max_joltage_difference=10**9), 1)
+
+        # With a single step size, the counts are the Fibonacci numbers.
+        self.assertEqual(get_num_adapter_chains(set(range(1, 11)), max_joltage_difference=2), 89)
+        self.assertEqual(get_num_adapter_chains(set(range(1, 11)), max_joltage_difference=20), 2**9)
+        self.assertEqual(get_num_adapter_chains({1, 2, 3, 5, 9, 10, 13}, max_joltage_difference=4), 14)
+        self.assertEqual(get_num_adapter_chains({1, 2, 3, 5, 9, 10, 13, 14}, max_joltage_difference=4, modulus=5), 21 % 5)
+        self.assertEqual(get_num_adapter_chains(set(range(1, 10**4)), max_joltage_difference=2, modulus=10**9 + 7),
+                         get_num_adapter_chains(set(range(1, 10**4)), max_joltage_difference=2) % (10**9 + 7))
 
 if __name__ == '__main__':
     unittest.main(exit=False)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
 import copy
+import operator
 import unittest
+from array import array
 from enum import IntEnum
 
 class Seat(IntEnum):
@@ -68,6 +70,191 @@ def converge(seats):
 def count_occupied(seats):
     return sum(row.count(Seat.OCCUPIED) for row in seats)
 
+BORDER = 3 # Padding around the floor plan, so no neighbor offset wraps into another row.
+
+def build_transition_table(threshold):
+    # Indexed by seat * 16 + occupied neighbor count.
+    table = bytearray(256)
+    for seat in (Seat.FLOOR, Seat.EMPTY, Seat.OCCUPIED, BORDER):
+        for count in range(9):
+            if seat == Seat.EMPTY and count == 0:
+                new_seat = Seat.OCCUPIED
+            elif seat == Seat.OCCUPIED and count >= threshold:
+                new_seat = Seat.EMPTY
+            else:
+                new_seat = seat
+            table[seat * 16 + count] = new_seat
+    return bytes(table)
+
+occupied_table = bytes(int(i == Seat.OCCUPIED) for i in range(256))
+floor_table = bytes(int(i == Seat.FLOOR) for i in range(256))
+
+class SeatSimulator:
+    """Floor plan as one padded byte per cell. Each generation works on whole-grid integers, one byte per cell, so
+    neighbor counts are a few shifts and adds rather than a Python loop over cells."""
+
+    def __init__(self, seats, line_of_sight=True):
+        self.rows = len(seats)
+        self.cols = len(seats[0])
+        self.width = self.cols + 2
+        self.size = self.width * (self.rows + 2)
+        self.cells = bytearray([BORDER]) * self.size
+        for row, line in enumerate(seats):
+            start = (row + 1) * self.width + 1
+            self.cells[start:start+self.cols] = bytes(line)
+        self.next_cells = bytearray(self.size)
+        self.line_of_sight = line_of_sight
+        self.transition = build_transition_table(5 if line_of_sight else 4)
+        self.mask = (1 << (8 * self.size)) - 1
+        self.offsets = [dir_row * self.width + dir_col for dir_row, dir_col in neighbors]
+        self.generations = 0
+
+    def shift(self, x, offset):
+        # Moves the byte for cell i + offset to cell i.
+        return x >> (8 * offset) if offset > 0 else (x << (-8 * offset)) & self.mask
+
+    def count_visible(self, occupied, floor, offset):
+        # Pointer jumping: visible is set where the first seat within `steps` cells is occupied, and clear is set
+        # where those cells are all floor. Each round doubles `steps`.
+        visible = self.shift(occupied, offset)
+        clear = self.shift(floor, offset)
+        steps = 1
+        while clear and steps < max(self.rows, self.cols):
+            visible |= clear & self.shift(visible, offset * steps)
+            clear &= self.shift(clear, offset * steps)
+            steps *= 2
+        return visible
+
+    def count_neighbors(self):
+        occupied = int.from_bytes(self.cells.translate(occupied_table), 'little')
+        if self.line_of_sight:
+            floor = int.from_bytes(self.cells.translate(floor_table), 'little')
+            return sum(self.count_visible(occupied, floor, offset) for offset in self.offsets)
+        return sum(self.shift(occupied, offset) for offset in self.offsets)
+
+    def step(self):
+        cells = int.from_bytes(self.cells, 'little')
+        counts = self.count_neighbors() # At most 8 per byte, so bytes never carry into each other.
+        self.next_cells[:] = ((cells << 4) + counts).to_bytes(self.size, 'little').translate(self.transition)
+        changed = self.size - (int.from_bytes(self.next_cells, 'little') ^ cells).to_bytes(self.size, 'little').count(0)
+        self.cells, self.next_cells = self.next_cells, self.cells
+        self.generations += 1
+        return changed
+
+    def converge(self):
+        while self.step():
+            pass
+        return self.generations
+
+    def count_occupied(self):
+        return self.cells.count(Seat.OCCUPIED)
+
+    def to_seats(self):
+        return [[Seat(c) for c in self.cells[(row + 1) * self.width + 1:(row + 1) * self.width + 1 + self.cols]] for row in range(self.rows)]
+
+def build_neighbor_table(seats, line_of_sight=True):
+    # Seats get dense indices in reading order; index len(positions) is a sentinel that is never occupied.
+    positions = [(row, col) for row in range(len(seats)) for col in range(len(seats[0])) if seats[row][col] != Seat.FLOOR]
+    ids = {position: i for i, position in enumerate(positions)}
+    sentinel = len(positions)
+    table = array('i', [sentinel]) * (len(positions) * len(neighbors))
+    for k, (dir_row, dir_col) in enumerate(neighbors):
+        # Sweep against the direction, so the cell one step along it is resolved before the current one.
+        rows = range(len(seats)) if dir_row <= 0 else range(len(seats) - 1, -1, -1)
+        cols = range(len(seats[0])) if dir_col <= 0 else range(len(seats[0]) - 1, -1, -1)
+        nearest = {}
+        for row in rows:
+            for col in cols:
+                next_position = (row + dir_row, col + dir_col)
+                visible = ids.get(next_position)
+                if visible is None:
+                    visible = nearest.get(next_position, sentinel) if line_of_sight else sentinel
+                nearest[row, col] = visible
+                if (row, col) in ids:
+                    table[ids[row, col] * len(neighbors) + k] = visible
+    return positions, table
+
+class TableSeatSimulator:
+    """Keeps only the seats, with each seat's visible neighbors resolved once up front. A generation is then a
+    gather-and-sum over the table, so long sight lines cost no more than adjacent neighbors.
+
+    In incremental mode, occupied-neighbor counts are kept up to date as seats flip, and each generation only
+    re-evaluates the seats that flipped or saw a neighbor flip in the previous one."""
+
+    def __init__(self, seats, line_of_sight=True, incremental=False):
+        self.rows = len(seats)
+        self.cols = len(seats[0])
+        self.positions, self.table = build_neighbor_table(seats, line_of_sight)
+        self.num_seats = len(self.positions)
+        self.gathers = [operator.itemgetter(*self.table[k::len(neighbors)]) for k in range(len(neighbors))] if self.num_seats else []
+        self.occupied = bytearray(self.num_seats + 1) # Last byte is the sentinel.
+        for i, (row, col) in enumerate(self.positions):
+            self.occupied[i] = seats[row][col] == Seat.OCCUPIED
+        self.next_occupied = bytearray(self.num_seats + 1)
+        # Same rules as SeatSimulator, but indexed by occupied (0 or 1) * 16 + count and yielding 0 or 1.
+        transition = build_transition_table(5 if line_of_sight else 4)
+        self.transition = bytes(transition[(Seat.EMPTY + i // 16) * 16 + i % 16] - Seat.EMPTY if i < 32 and i % 16 <= 8 else 0 for i in range(256))
+        self.threshold = 5 if line_of_sight else 4
+        self.generations = 0
+        self.incremental = incremental
+        self.active_sizes = [] # Seats evaluated in each incremental generation.
+        if incremental:
+            self.active = range(self.num_seats)
+            # Plain ints, since the sentinel's count can grow past a byte.
+            self.counts = array('i', [0]) * (self.num_seats + 1)
+            for i in range(self.num_seats):
+                for j in self.table[i*8:(i+1)*8]:
+                    self.counts[i] += self.occupied[j]
+
+    def count_neighbors(self):
+        if self.num_seats == 1:
+            return sum(gather(self.occupied) for gather in self.gathers) # itemgetter with one index returns a bare int.
+        return sum(int.from_bytes(bytes(gather(self.occupied)), 'little') for gather in self.gathers)
+
+    def step(self):
+        if self.incremental:
+            return self.step_incremental()
+        size = self.num_seats
+        occupied = int.from_bytes(self.occupied[:size], 'little')
+        counts = self.count_neighbors()
+        self.next_occupied[:size] = ((occupied << 4) + counts).to_bytes(size, 'little').translate(self.transition)
+        changed = size - (int.from_bytes(self.next_occupied[:size], 'little') ^ occupied).to_bytes(size, 'little').count(0)
+        self.occupied, self.next_occupied = self.next_occupied, self.occupied
+        self.generations += 1
+        return changed
+
+    def step_incremental(self):
+        occupied, counts, table, threshold = self.occupied, self.counts, self.table, self.threshold
+        # Decide every flip before applying any, so all seats see the same generation.
+        flips = [i for i in self.active if (counts[i] >= threshold if occupied[i] else counts[i] == 0)]
+        active = set(flips)
+        for i in flips:
+            occupied[i] ^= 1
+            delta = 1 if occupied[i] else -1
+            neighbors_ = table[i*8:(i+1)*8]
+            for j in neighbors_:
+                counts[j] += delta
+            active.update(neighbors_)
+        active.discard(self.num_seats)
+        self.active_sizes.append(len(self.active))
+        self.active = active
+        self.generations += 1
+        return len(flips)
+
+    def converge(self):
+        while self.step():
+            pass
+        return self.generations
+
+    def count_occupied(self):
+        return self.occupied.count(1)
+
+    def to_seats(self):
+        seats = [[Seat.FLOOR for col in range(self.cols)] for row in range(self.rows)]
+        for i, (row, col) in enumerate(self.positions):
+            seats[row][col] = Seat.OCCUPIED if self.occupied[i] else Seat.EMPTY
+        return seats
+
 class Test(unittest.TestCase):
     def test_is_occupied(self):
         with open('test2.txt') as f:
@@ -105,10 +292,94 @@ class Test(unittest.TestCase):
         seats = converge(seats)
         self.assertEqual(count_occupied(seats), 26)
 
+    def test_seat_simulator(self):
+        with open('test1.txt') as f:
+            seats = parse_input(f)
+        simulator = SeatSimulator(seats)
+        self.assertEqual(simulator.to_seats(), seats)
+        for i in range(1, 7):
+            self.assertGreater(simulator.step(), 0)
+            with open(f'test1_{i}.txt') as f:
+                exp = parse_input(f)
+            self.assertEqual(simulator.to_seats(), exp, f'iteration {i}')
+        self.assertEqual(simulator.step(), 0)
+
+        simulator = SeatSimulator(seats)
+        self.assertEqual(simulator.converge(), 7)
+        self.assertEqual(simulator.count_occupied(), 26)
+
+        simulator = SeatSimulator(seats, line_of_sight=False)
+        simulator.converge()
+        self.assertEqual(simulator.count_occupied(), 37)
+
+        with open('input.txt') as f:
+            seats = parse_input(f)
+        simulator = SeatSimulator(seats)
+        simulator.converge()
+        self.assertEqual(simulator.to_seats(), converge(seats))
+
+    def test_build_neighbor_table(self):
+        with open('test2.txt') as f:
+            seats = parse_input(f)
+        positions, table = build_neighbor_table(seats)
+        i = positions.index((4, 3))
+        visible = [positions[j] for j in table[i*8:(i+1)*8]]
+        self.assertEqual(visible, [(2, 1), (1, 3), (0, 7), (4, 2), (4, 8), (7, 0), (8, 3), (5, 4)])
+
+        with open('test3.txt') as f:
+            seats = parse_input(f)
+        positions, table = build_neighbor_table(seats)
+        i = positions.index((1, 1))
+        self.assertEqual([positions[j] if j < len(positions) else None for j in table[i*8:(i+1)*8]], [None] * 4 + [(1, 3)] + [None] * 3)
+
+    def test_table_seat_simulator(self):
+        with open('test1.txt') as f:
+            seats = parse_input(f)
+        simulator = TableSeatSimulator(seats)
+        for i in range(1, 7):
+            self.assertGreater(simulator.step(), 0)
+            with open(f'test1_{i}.txt') as f:
+                exp = parse_input(f)
+            self.assertEqual(simulator.to_seats(), exp, f'iteration {i}')
+        self.assertEqual(simulator.step(), 0)
+
+        for filename in ['test1.txt', 'test2.txt', 'test3.txt', 'test4.txt', 'input.txt']:
+            with open(filename) as f:
+                seats = parse_input(f)
+            for line_of_sight in (True, False):
+                simulator = TableSeatSimulator(seats, line_of_sight)
+                exp = SeatSimulator(seats, line_of_sight)
+                self.assertEqual(simulator.converge(), exp.converge(), filename)
+                self.assertEqual(simulator.to_seats(), exp.to_seats(), filename)
+
+    def test_incremental(self):
+        with open('test1.txt') as f:
+            seats = parse_input(f)
+        simulator = TableSeatSimulator(seats, incremental=True)
+        for i in range(1, 7):
+            self.assertGreater(simulator.step(), 0)
+            with open(f'test1_{i}.txt') as f:
+                exp = parse_input(f)
+            self.assertEqual(simulator.to_seats(), exp, f'iteration {i}')
+        self.assertEqual(simulator.step(), 0)
+        self.assertEqual(simulator.active_sizes[0], 71)
+
+        with open('input.txt') as f:
+            seats = parse_input(f)
+        for line_of_sight in (True, False):
+            simulator = TableSeatSimulator(seats, line_of_sight, incremental=True)
+            exp = TableSeatSimulator(seats, line_of_sight)
+            self.assertEqual(simulator.converge(), exp.converge())
+            self.assertEqual(simulator.to_seats(), exp.to_seats())
+            self.assertEqual(len(simulator.active_sizes), simulator.generations)
+            self.assertEqual(simulator.active_sizes[0], simulator.num_seats)
+            self.assertLess(simulator.active_sizes[-1], simulator.num_seats // 10) # Work shrinks as the plan settles.
+
 if __name__ == '__main__':
     unittest.main(exit=False)
 
     with open('input.txt') as f:
         seats = parse_input(f)
-    seats = converge(seats)
-    print(count_occupied(seats))
+    simulator = SeatSimulator(seats)
+    simulator.converge()
+    print(simulator.count_occupied())